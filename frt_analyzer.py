@@ -1,13 +1,11 @@
 import streamlit as st
-import xml.etree.ElementTree as ET
-import pandas as pd
-from io import BytesIO, StringIO
 from lxml import etree
 import os
 
-# Inject custom CSS and JavaScript for full-screen layout
-st.markdown(
-    """
+from frt_core import FAILED_REQUEST_TAG, classify_root_cause, parse_frt, csv_bytes_for, render_report
+
+# Custom CSS and JavaScript for full-screen layout; built once at import
+_CSS = """
     <style>
     html, body {
         height: 100%;
@@ -56,9 +54,11 @@ st.markdown(
     }
     window.addEventListener('load', makeFullScreen);
     </script>
-    """,
-    unsafe_allow_html=True
-)
+    """
+
+# Re-emitted each run: Streamlit drops elements that a rerun does not produce,
+# so a once-per-session guard would strip the styling on the next interaction
+st.markdown(_CSS, unsafe_allow_html=True)
 
 # Initialize session state
 if "fullscreen" not in st.session_state:
@@ -83,26 +83,22 @@ if not st.session_state.fullscreen:
         else:
             st.warning("Please upload an XML file and select 'Use freb.xsl (HTML Report)' to enter full-screen mode.")
 
-# Load freb.xsl
 xsl_path = "freb.xsl"
-xsl_bytes = None
-if os.path.exists(xsl_path):
-    with open(xsl_path, "rb") as f:
-        xsl_bytes = f.read()
-else:
+xsl_available = os.path.exists(xsl_path)
+if not xsl_available:
     st.error("freb.xsl not found. Please upload it or use the Parse Events Directly option.")
 
 # Full-screen mode
 if st.session_state.fullscreen:
     st.markdown('<div class="fullscreen-mode">', unsafe_allow_html=True)
-    if st.session_state.uploaded_xml and xsl_bytes and st.session_state.render_option == "Use freb.xsl (HTML Report)":
+    if st.session_state.uploaded_xml and xsl_available and st.session_state.render_option == "Use freb.xsl (HTML Report)":
         try:
-            xml_bytes = st.session_state.uploaded_xml.getvalue()
-            xml_doc = etree.parse(BytesIO(xml_bytes))
-            xsl_doc = etree.parse(BytesIO(xsl_bytes))
-            transform = etree.XSLT(xsl_doc)
-            html_result = transform(xml_doc)
-            st.components.v1.html(f'<div onload="makeFullScreen()">{str(html_result)}</div>', height=1000, scrolling=True)
+            with st.spinner("Transforming report..."):
+                html_result = render_report(st.session_state.uploaded_xml.getvalue(), xsl_path)
+            # Emit the fullscreen hook as its own tiny component so the report
+            # string is never copied into a wrapping f-string
+            st.components.v1.html('<script>parent.makeFullScreen && parent.makeFullScreen();</script>', height=0)
+            st.components.v1.html(html_result, height=1000, scrolling=True)
         except MemoryError:
             st.error("Memory error occurred. Please use a smaller XML file or increase server resources.")
             if st.button("Exit Full-Screen Mode"):
@@ -123,81 +119,49 @@ if st.session_state.fullscreen:
 if st.session_state.uploaded_xml and not st.session_state.fullscreen:
     try:
         if st.session_state.render_option == "Parse Events Directly (Table View)":
-            xml_content = StringIO(st.session_state.uploaded_xml.getvalue().decode("utf-8"))
-            tree = ET.parse(xml_content)
-            root = tree.getroot()
+            xml_bytes = st.session_state.uploaded_xml.getvalue()
+            summary, events = parse_frt(xml_bytes)
 
-            if root.tag not in ["failedRequest", "{http://schemas.microsoft.com/win/2004/08/events/trace}failedRequest"]:
+            if summary["root_tag"] not in ("failedRequest", FAILED_REQUEST_TAG):
                 st.error("Invalid FRT XML: Missing or unrecognized <failedRequest> root tag.")
-                st.write(f"Root tag found: {root.tag}")
+                st.write(f"Root tag found: {summary['root_tag']}")
             else:
-                # Extract summary
-                url = root.get("url", "N/A")
-                status_code = root.get("statusCode", "N/A")
-                sub_status_code = root.get("subStatusCode", "N/A")
-                time_taken = root.get("timeTaken", "N/A")
-                site = root.get("siteId", "N/A")
-                process = root.get("processId", "N/A")
-                app_pool = root.get("appPoolId", "N/A")
-                authentication = root.get("authentication", "N/A")
-                user = root.get("userName", "N/A")
-                activity_id = root.get("activityId", "N/A")
-                verb = next((data.find("value").text for data in root.iterfind(".//{http://schemas.microsoft.com/win/2004/08/events/trace}data") 
-                            if data.find("name") is not None and data.find("name").text == "VERB" and data.find("value") is not None), "N/A")
-
-                # Extract events
-                events = []
-                ns = {"iis": "http://schemas.microsoft.com/win/2004/08/events/trace"}
-                event_nodes = list(root.iterfind(".//{http://schemas.microsoft.com/win/2004/08/events/trace}event")) or list(root.iter("event"))
-
-                for i, event in enumerate(event_nodes):
-                    event_name = (event.find("name", ns) or event.find("name")).text if (event.find("name", ns) or event.find("name")) is not None else "Unknown"
-                    reason = event.get("reason", "")
-                    time_ms = event.get("time", None)
-                    time_ms = int(float(time_ms)) if time_ms else i * 10
-                    provider = (event.find("providerName", ns) or event.find("providerName")).text if (event.find("providerName", ns) or event.find("providerName")) is not None else ""
-                    events.append({"Time (ms)": time_ms, "Event Name": event_name, "Provider": provider, "Reason": reason})
-
-                # Create DataFrame
-                df = pd.DataFrame(events).sort_values("Time (ms)") if events else pd.DataFrame()
+                status_code = summary["status_code"]
 
                 # Root cause detection
-                root_cause = "Unknown"
-                if status_code == "404":
-                    root_cause = "File Not Found (Check physical path)"
-                elif status_code == "500":
-                    root_cause = "Server Error (Review modules/logs)"
+                root_cause = classify_root_cause(status_code, summary["sub_status_code"])
 
                 # Display summary
                 st.subheader("Request Summary")
                 cols = st.columns(4)
-                cols[0].metric("URL", url)
-                cols[1].metric("Status Code", f"{status_code}.{sub_status_code}")
-                cols[2].metric("Time Taken", f"{time_taken} ms")
+                cols[0].metric("URL", summary["url"])
+                cols[1].metric("Status Code", f"{status_code}.{summary['sub_status_code']}")
+                cols[2].metric("Time Taken", f"{summary['time_taken']} ms")
                 cols[3].metric("Root Cause", root_cause)
-                cols[0].metric("Site", site)
-                cols[1].metric("Process", process)
-                cols[2].metric("App Pool", app_pool)
-                cols[3].metric("Authentication", authentication)
-                cols[0].metric("User", user)
-                cols[1].metric("Activity ID", activity_id)
-                cols[2].metric("Verb", verb)
-
-                # Display timeline
+                cols[0].metric("Site", summary["site"])
+                cols[1].metric("Process", summary["process"])
+                cols[2].metric("App Pool", summary["app_pool"])
+                cols[3].metric("Authentication", summary["authentication"])
+                cols[0].metric("User", summary["user"])
+                cols[1].metric("Activity ID", summary["activity_id"])
+                cols[2].metric("Verb", summary["verb"])
+
+                # Display timeline (Arrow tables go to the browser as-is,
+                # skipping the pandas -> Arrow conversion per rerun)
                 st.subheader("Event Timeline")
-                if not df.empty:
-                    st.dataframe(df, use_container_width=True)
+                if events.num_rows:
+                    st.dataframe(events, use_container_width=True)
                 else:
                     st.warning("No events found in the XML file.")
 
                 # Insights
                 st.subheader("Insights")
-                st.write(f"- Total Events: {len(events)}")
+                st.write(f"- Total Events: {events.num_rows}")
                 st.write(f"- Recommendation: For {root_cause}, inspect the error in the timeline.")
 
                 # Download CSV
-                if not df.empty:
-                    csv = df.to_csv(index=False).encode("utf-8")
+                if events.num_rows:
+                    csv = csv_bytes_for(xml_bytes)
                     st.download_button("Download Timeline as CSV", csv, "frt_timeline.csv", "text/csv")
 
     except etree.ParseError as e:
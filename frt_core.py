@@ -0,0 +1,329 @@
+"""Cached parsing and transform pipeline shared by the Streamlit UI.
+
+Keeping the hot functions in one module means every parse/transform
+optimization lands in a single place instead of drifting across copies
+of the app script.
+"""
+
+import streamlit as st
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.parquet
+from io import BytesIO
+from lxml import etree
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sys import intern
+import hashlib
+import json
+import os
+
+IIS_NS_URI = "http://schemas.microsoft.com/win/2004/08/events/trace"
+IIS_NS = {"iis": IIS_NS_URI}
+
+# Clark-notation tags, interned once at import and shared by every lookup
+FAILED_REQUEST_TAG = f"{{{IIS_NS_URI}}}failedRequest"
+EVENT_TAG = f"{{{IIS_NS_URI}}}event"
+NAME_TAG = f"{{{IIS_NS_URI}}}name"
+PROVIDER_TAG = f"{{{IIS_NS_URI}}}providerName"
+DATA_TAG = f"{{{IIS_NS_URI}}}data"
+VALUE_TAG = f"{{{IIS_NS_URI}}}value"
+
+# Some exports carry a plain <failedRequest> root (which the UI accepts), so
+# each parse picks one tag form from the root and sticks with it
+IIS_FIELD_TAGS = (NAME_TAG, PROVIDER_TAG, DATA_TAG, VALUE_TAG)
+PLAIN_FIELD_TAGS = ("name", "providerName", "data", "value")
+
+# Parser tuning for local trusted FRT files: lift the 10M-node limit, skip
+# entity expansion / ID bookkeeping / network access, and drop the
+# pretty-printing whitespace nodes that only bloat the tree. Applied to the
+# input XML, not to freb.xsl, whose templates may carry significant whitespace.
+FRT_PARSE_OPTS = dict(huge_tree=True, collect_ids=False, resolve_entities=False,
+                      no_network=True, remove_blank_text=True)
+FRT_PARSER = etree.XMLParser(**FRT_PARSE_OPTS)
+
+# Below this size a full-tree parse beats the streaming path's per-event
+# Python overhead; streaming only wins on big documents
+SMALL_FILE_BYTES = 1_000_000
+
+# On-disk cache of parsed timelines: Parquet rehydrates in milliseconds and
+# survives app restarts, unlike st.cache_data's in-process store. Uploads are
+# untrusted input, so the cache is capped: oldest entries are pruned once the
+# directory exceeds CACHE_MAX_BYTES.
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "frt_analyzer")
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _parquet_cache_path(xml_bytes):
+    digest = hashlib.blake2b(xml_bytes, digest_size=16).hexdigest()
+    return os.path.join(CACHE_DIR, f"{digest}.parquet")
+
+
+def _read_parquet_cache(path):
+    events = pa.parquet.read_table(path)
+    summary = json.loads(events.schema.metadata[b"frt_summary"])
+    # Refresh the mtime so recently used entries survive pruning
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return summary, events
+
+
+def _prune_parquet_cache():
+    # Evict oldest-first until the cache fits the cap
+    entries = []
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".parquet"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    entries.sort()
+    for _, size, path in entries:
+        if total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _write_parquet_cache(path, summary, events):
+    # Best effort: a read-only or full disk should never break parsing
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        annotated = events.replace_schema_metadata({"frt_summary": json.dumps(summary)})
+        pa.parquet.write_table(annotated, path, compression="zstd")
+        _prune_parquet_cache()
+    except OSError:
+        pass
+
+
+def _extract_event(event, want_verb, field_tags):
+    # One pass over the event's children dispatching on tag, instead of a
+    # separate find()/XPath walk per field
+    name_tag, provider_tag, data_tag, value_tag = field_tags
+    name = ""
+    provider = ""
+    verb = None
+    for child in event:
+        tag = child.tag
+        if tag == name_tag:
+            name = child.text or ""
+        elif tag == provider_tag:
+            provider = child.text or ""
+        elif want_verb and tag == data_tag:
+            data_name = None
+            data_value = None
+            for field in child:
+                if field.tag == name_tag:
+                    data_name = field.text
+                elif field.tag == value_tag:
+                    data_value = field.text
+            if data_name == "VERB" and data_value is not None:
+                verb = data_value
+    return name, provider, verb
+
+# Status code (or status/substatus pair) -> likely root cause; new diagnoses
+# are added here as data rather than growing an if/elif chain in the UI
+ROOT_CAUSES = {
+    ("404", "2"): "ISAPI/CGI Restriction (Check handler restrictions)",
+    ("404", "3"): "MIME Type Restriction (Add a MIME map for the extension)",
+    ("500", "19"): "Invalid Configuration Data (Check web.config)",
+    "404": "File Not Found (Check physical path)",
+    "500": "Server Error (Review modules/logs)",
+}
+
+
+def classify_root_cause(status_code, sub_status_code):
+    # Prefer the specific status.substatus diagnosis, fall back to the
+    # status-wide one
+    return (ROOT_CAUSES.get((status_code, sub_status_code))
+            or ROOT_CAUSES.get(status_code, "Unknown"))
+
+
+# Load and compile freb.xsl once per server process; reruns reuse the compiled transform
+@st.cache_resource
+def get_transform(xsl_path):
+    with open(xsl_path, "rb") as f:
+        xsl_doc = etree.parse(BytesIO(f.read()))
+    return etree.XSLT(xsl_doc)
+
+
+# Cache the whole parse per upload: reruns from widget interactions get the
+# summary and DataFrame back without touching the XML again
+@st.cache_data(show_spinner=False, max_entries=4)
+def parse_frt(xml_bytes):
+    # Second-level cache: the same trace re-uploaded after a restart (or a
+    # cache eviction) rehydrates from Parquet instead of re-parsing the XML
+    cache_path = _parquet_cache_path(xml_bytes)
+    if os.path.exists(cache_path):
+        try:
+            return _read_parquet_cache(cache_path)
+        except (OSError, KeyError, pa.ArrowInvalid):
+            pass  # stale or truncated cache file; fall through and re-parse
+
+    # One shared buffer for both passes; BytesIO reuses the caller's bytes
+    # object until written to, so this adds no copy
+    buf = BytesIO(xml_bytes)
+
+    # Typical single-request traces are well under a megabyte: for those, a
+    # plain full-tree parse is cheaper than the streaming machinery, which
+    # only pays off once document size (not per-event overhead) dominates
+    streaming = len(xml_bytes) >= SMALL_FILE_BYTES
+
+    root_tag = None
+    attrs = {}
+    if streaming:
+        # Small pre-pass: stop at the root start tag to read the summary attributes
+        for _, elem in etree.iterparse(buf, events=("start",), **FRT_PARSE_OPTS):
+            root_tag = elem.tag
+            attrs = dict(elem.attrib)
+            break
+    else:
+        root = etree.parse(buf, parser=FRT_PARSER).getroot()
+        root_tag = root.tag
+        attrs = dict(root.attrib)
+
+    summary = {
+        "root_tag": root_tag,
+        "url": attrs.get("url", "N/A"),
+        "status_code": attrs.get("statusCode", "N/A"),
+        "sub_status_code": attrs.get("subStatusCode", "N/A"),
+        "time_taken": attrs.get("timeTaken", "N/A"),
+        "site": attrs.get("siteId", "N/A"),
+        "process": attrs.get("processId", "N/A"),
+        "app_pool": attrs.get("appPoolId", "N/A"),
+        "authentication": attrs.get("authentication", "N/A"),
+        "user": attrs.get("userName", "N/A"),
+        "activity_id": attrs.get("activityId", "N/A"),
+    }
+
+    # The baseline accepted both namespaced and plain <failedRequest>
+    # documents; choose the tag form once from the root instead of running
+    # fallback queries per element
+    if root_tag is not None and root_tag.startswith("{"):
+        event_tag = EVENT_TAG
+        field_tags = IIS_FIELD_TAGS
+    else:
+        event_tag = "event"
+        field_tags = PLAIN_FIELD_TAGS
+
+    # Extract events one at a time, freeing each subtree as we go so
+    # peak memory stays at one event rather than the whole document
+    verb = "N/A"
+    raw_times = []
+    names = []
+    providers = []
+    reasons = []
+    if streaming:
+        buf.seek(0)
+        context = etree.iterparse(buf, events=("end",), tag=event_tag,
+                                  **FRT_PARSE_OPTS)
+        event_iter = (event for _, event in context)
+    else:
+        event_iter = root.iterfind(".//" + event_tag)
+
+    for event in event_iter:
+        event_name, provider, event_verb = _extract_event(event, verb == "N/A", field_tags)
+        event_name = event_name or "Unknown"
+        reason = event.get("reason", "")
+        if event_verb:
+            verb = event_verb
+        raw_times.append(event.get("time"))
+        # Traces repeat the same ~20 names/providers thousands of times;
+        # interning keeps one str object per distinct value while the
+        # columns accumulate, before dictionary encoding takes over
+        names.append(intern(event_name))
+        providers.append(intern(provider))
+        reasons.append(reason)
+        if streaming:
+            event.clear()
+            while event.getprevious() is not None:
+                del event.getparent()[0]
+
+    summary["verb"] = verb
+
+    # Create DataFrame column-by-column; pandas skips per-row dtype inference
+    if raw_times:
+        # One vectorized conversion instead of float()/int() calls per event;
+        # missing or unparsable times fall back to the old i * 10 spacing
+        time_col = pd.to_numeric(pd.Series(raw_times), errors="coerce")
+        time_arr = time_col.fillna(pd.Series(np.arange(len(raw_times)) * 10)).astype("int32").to_numpy()
+        # FRT writes events in chronological order, so the common case needs
+        # no sort at all — just an O(N) monotonicity check. Out-of-order input
+        # is reordered on the contiguous int array before the frame exists,
+        # which beats sort_values copying a finished DataFrame.
+        if len(time_arr) > 1 and not (time_arr[1:] >= time_arr[:-1]).all():
+            order = np.argsort(time_arr, kind="stable")
+            time_arr = time_arr[order]
+            names = [names[i] for i in order]
+            providers = [providers[i] for i in order]
+            reasons = [reasons[i] for i in order]
+        # Build the Arrow table Streamlit would otherwise convert to on every
+        # st.dataframe call. Dictionary-encoding the repetitive name/provider
+        # columns is Arrow's analog of pandas categories: int codes plus a
+        # small value dictionary instead of N string objects.
+        events = pa.table({
+            "Time (ms)": pa.array(time_arr),
+            "Event Name": pa.array(names).dictionary_encode(),
+            "Provider": pa.array(providers).dictionary_encode(),
+            "Reason": pa.array(reasons),
+        })
+    else:
+        events = pa.table({"Time (ms)": pa.array([], pa.int32()),
+                           "Event Name": pa.array([], pa.string()),
+                           "Provider": pa.array([], pa.string()),
+                           "Reason": pa.array([], pa.string())})
+
+    _write_parquet_cache(cache_path, summary, events)
+    return summary, events
+
+
+# Cache the CSV encode too; it re-runs on every rerun otherwise, and it is
+# the second hottest operation in the table-view path. Keyed on the upload
+# bytes (Arrow tables are not hashable cache keys); the table itself comes
+# back from parse_frt's cache for free.
+@st.cache_data
+def csv_bytes_for(xml_bytes):
+    _, events = parse_frt(xml_bytes)
+    buf = BytesIO()
+    # pyarrow's C++ CSV writer runs without the GIL and is several times
+    # faster than pandas.to_csv
+    pa.csv.write_csv(events, buf)
+    return buf.getvalue()
+
+
+def _transform_in_worker(xml_bytes, xsl_path):
+    # Runs inside the pool worker; get_transform's cache lives per process,
+    # so the stylesheet compiles once per worker too
+    xml_doc = etree.parse(BytesIO(xml_bytes), parser=FRT_PARSER)
+    transform = get_transform(xsl_path)
+    # Serialize once with libxml2's HTML serializer; str() goes through the
+    # XML serializer and costs a second full copy of the report
+    return etree.tostring(transform(xml_doc), method="html", encoding="unicode")
+
+
+# One worker process shared across reruns; big transforms run outside the
+# script thread (and outside its GIL)
+@st.cache_resource
+def get_xslt_pool():
+    return ProcessPoolExecutor(max_workers=1)
+
+
+# Cache the rendered HTML per upload so reruns of the same file skip the transform
+@st.cache_data
+def render_report(xml_bytes, xsl_path):
+    try:
+        return get_xslt_pool().submit(_transform_in_worker, xml_bytes, xsl_path).result()
+    except BrokenProcessPool:
+        # The worker died mid-transform (typically OOM-killed by an oversized
+        # trace). Drop the poisoned executor so the next render gets a fresh
+        # pool instead of every session failing until a server restart, and
+        # surface the failure through the MemoryError path the UI handles.
+        get_xslt_pool.clear()
+        raise MemoryError("XSLT worker process died transforming this file")